@@ -16,8 +16,8 @@ def create_sample_script():
     c.drawString(50, height - 70, "A Short Film Script")
     
     # Script content
-    c.setFont("Helvetica", 12)
-    y = height - 120
+    text = c.beginText(50, height - 120)
+    text.setFont("Helvetica", 12, leading=15)
     
     script_lines = [
         "",
@@ -77,15 +77,16 @@ def create_sample_script():
         "THE END"
     ]
     
-    line_height = 15
+    # One text object per page rather than a drawString call per line
     for line in script_lines:
-        if y < 50:  # Start new page if needed
+        if text.getY() < 50:  # Start new page if needed
+            c.drawText(text)
             c.showPage()
-            c.setFont("Helvetica", 12)
-            y = height - 50
+            text = c.beginText(50, height - 50)
+            text.setFont("Helvetica", 12, leading=15)
         
-        c.drawString(50, y, line)
-        y -= line_height
+        text.textLine(line)
+    c.drawText(text)
     
     c.save()
     print(f"Sample script created: {filename}")
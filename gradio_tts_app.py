@@ -1,8 +1,10 @@
 import random
+import threading
 import numpy as np
 import torch
 import gradio as gr
 from chatterbox.tts import ChatterboxTTS
+from tts_utils import enable_mixed_precision, keep_builtin_conds
 
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
@@ -16,33 +18,52 @@ def set_seed(seed: int):
     np.random.seed(seed)
 
 
+tts_model = None
+tts_model_lock = threading.Lock()
+# Held while a request sets the model's voice and generates with it
+generation_lock = threading.Lock()
+# server.py points this and generation_lock at the script reader's replica,
+# so both UIs share one model in the single-process server
+model_loader = None
+
+
 def load_model():
-    model = ChatterboxTTS.from_pretrained(DEVICE)
-    return model
+    """Load the TTS model on first use; every session shares it"""
+    global tts_model
+    if model_loader is not None:
+        return model_loader()
+    with tts_model_lock:
+        if tts_model is None:
+            tts_model = keep_builtin_conds(enable_mixed_precision(ChatterboxTTS.from_pretrained(DEVICE), DEVICE))
+    return tts_model
 
 
 def generate(model, text, audio_prompt_path, exaggeration, temperature, seed_num, cfgw, min_p, top_p, repetition_penalty):
     if model is None:
-        model = ChatterboxTTS.from_pretrained(DEVICE)
+        model = load_model()
 
     if seed_num != 0:
         set_seed(int(seed_num))
 
-    wav = model.generate(
-        text,
-        audio_prompt_path=audio_prompt_path,
-        exaggeration=exaggeration,
-        temperature=temperature,
-        cfg_weight=cfgw,
-        min_p=min_p,
-        top_p=top_p,
-        repetition_penalty=repetition_penalty,
-    )
+    with generation_lock, torch.inference_mode():
+        if not audio_prompt_path:
+            # Otherwise the shared model would speak in the last session's cloned voice
+            model.conds = model.builtin_conds
+        wav = model.generate(
+            text,
+            audio_prompt_path=audio_prompt_path,
+            exaggeration=exaggeration,
+            temperature=temperature,
+            cfg_weight=cfgw,
+            min_p=min_p,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+        )
     return (model.sr, wav.squeeze(0).numpy())
 
 
 with gr.Blocks() as demo:
-    model_state = gr.State(None)  # Loaded once per session/user
+    model_state = gr.State(None)  # The shared model, loaded on first use
 
     with gr.Row():
         with gr.Column():
@@ -1,17 +1,47 @@
+import tempfile
+import threading
+import numpy as np
+import soundfile as sf
 import torch
 import gradio as gr
 from chatterbox.vc import ChatterboxVC
+from tts_utils import compile_model, enable_mixed_precision
 
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 
-model = ChatterboxVC.from_pretrained(DEVICE)
+def warm_up(model):
+    """Convert a second of silence so compilation happens before the first request"""
+    if model.ref_dict is not None:
+        with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+            sf.write(f.name, np.zeros(16000, dtype=np.float32), 16000)
+            model.generate(f.name)
+
+
+vc_model = None
+vc_model_lock = threading.Lock()
+
+
+def load_vc_model():
+    """Load the VC model on first use"""
+    global vc_model
+    with vc_model_lock:
+        if vc_model is None:
+            vc_model = compile_model(enable_mixed_precision(ChatterboxVC.from_pretrained(DEVICE), DEVICE), DEVICE, warmup=warm_up)
+    return vc_model
+
+
 def generate(audio, target_voice_path):
-    wav = model.generate(
-        audio, target_voice_path=target_voice_path,
-    )
-    return model.sr, wav.squeeze(0).numpy()
+    model = load_vc_model()
+    with torch.inference_mode():
+        wav = model.generate(
+            audio, target_voice_path=target_voice_path,
+        )
+    # generate() returns a CPU tensor, so this shares its buffer rather than copying
+    output = wav.squeeze(0).detach().numpy()
+    del wav
+    return model.sr, output
 
 
 demo = gr.Interface(
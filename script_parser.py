@@ -3,45 +3,69 @@ Film Script PDF Parser
 Extracts characters and their dialogue from PDF film scripts
 """
 import re
-import PyPDF2
+from collections import defaultdict
+from dataclasses import dataclass
+import pypdfium2 as pdfium
 from typing import Dict, List, Tuple
-from io import BytesIO
+
+
+# Part of the parsed-script cache key; bump whenever parse_script's output changes
+PARSER_VERSION = 1
+
+_PAREN_RE = re.compile(r'\([^)]*\)')
+_LETTER_RE = re.compile(r'[A-Za-z]')
+
+# Common false positives for character names
+_FALSE_POSITIVES = frozenset({
+    'THE END', 'TITLE CARD', 'MONTAGE', 'SERIES OF SHOTS',
+    'LATER', 'MEANWHILE', 'SAME TIME', 'MOMENTS LATER',
+    'FLASHBACK', 'DREAM SEQUENCE', 'VOICE OVER', 'V.O.',
+    'O.S.', 'OFF SCREEN', 'NARRATION'
+})
+
+
+@dataclass(frozen=True, slots=True)
+class ScriptView:
+    """Parsed script laid out as parallel tuples, so UI callbacks can look characters up by index"""
+    names: Tuple[str, ...]
+    lines: Tuple[Tuple[str, ...], ...]
+    previews: Tuple[str, ...]
+    
+    @classmethod
+    def from_script_data(cls, script_data: Dict[str, List[str]]) -> 'ScriptView':
+        """Build the view once, including the dialogue preview shown for each character"""
+        lines = tuple(tuple(dialogue) for dialogue in script_data.values())
+        previews = tuple(
+            "\n".join(dialogue[:3]) + (f"\n... and {len(dialogue) - 3} more lines" if len(dialogue) > 3 else "")
+            for dialogue in lines
+        )
+        return cls(tuple(script_data), lines, previews)
 
 
 class ScriptParser:
     def __init__(self):
-        # Common patterns for script formatting
-        self.character_patterns = [
-            r'^([A-Z][A-Z\s\.\-\']+)$',  # All caps character names
-            r'^([A-Z][A-Z\s\.\-\']+):',  # Character names with colon
-            r'^\s*([A-Z][A-Z\s\.\-\']+)\s*$',  # Whitespace around character names
-        ]
+        # Character names in all caps, either alone on the line or followed by a colon
+        self.character_pattern = re.compile(r'^([A-Z][A-Z\s\.\-\']+)(?::|$)')
         
         # Patterns to ignore (stage directions, scene descriptions, etc.)
-        self.ignore_patterns = [
-            r'^\s*(INT\.|EXT\.)',  # Scene headers
-            r'^\s*(FADE IN|FADE OUT|CUT TO)',  # Transitions
-            r'^\s*\([^)]*\)$',  # Stage directions in parentheses
-            r'^\s*[0-9]+\.$',  # Page numbers
-            r'^\s*(CONTINUED|CONT\'D)',  # Continuations
-        ]
+        self.ignore_pattern = re.compile(r'^\s*(?:' + '|'.join([
+            r'INT\.|EXT\.',  # Scene headers
+            r'FADE IN|FADE OUT|CUT TO',  # Transitions
+            r'\([^)]*\)$',  # Stage directions in parentheses
+            r'[0-9]+\.$',  # Page numbers
+            r'CONTINUED|CONT\'D',  # Continuations
+        ]) + r')', re.IGNORECASE)
     
     def extract_text_from_pdf(self, pdf_file) -> str:
         """Extract text from PDF file"""
         try:
-            if isinstance(pdf_file, str):
-                with open(pdf_file, 'rb') as file:
-                    reader = PyPDF2.PdfReader(file)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text() + "\n"
-            else:
-                # Handle file upload object
-                reader = PyPDF2.PdfReader(BytesIO(pdf_file.read()))
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+            # Accepts a file path or a binary file object; PDFium reads either
+            # lazily, so the whole file is never buffered in memory
+            pdf = pdfium.PdfDocument(pdf_file)
+            try:
+                return "\n".join(page.get_textpage().get_text_range() or "" for page in pdf)
+            finally:
+                pdf.close()
         except Exception as e:
             raise Exception(f"Error reading PDF: {str(e)}")
     
@@ -51,30 +75,28 @@ class ScriptParser:
         if not line:
             return True
         
-        for pattern in self.ignore_patterns:
-            if re.match(pattern, line, re.IGNORECASE):
-                return True
-        return False
+        return self.ignore_pattern.match(line) is not None
     
     def is_character_name(self, line: str) -> str:
         """Check if line is a character name and return cleaned name"""
-        line = line.strip()
-        
+        return self._character_name(line.strip())
+    
+    def _character_name(self, line: str) -> str:
+        """is_character_name for a line that has already been stripped"""
         # Skip empty lines or obvious non-character lines
         if not line or len(line) < 2 or len(line) > 50:
             return None
         
-        for pattern in self.character_patterns:
-            match = re.match(pattern, line)
-            if match:
-                character = match.group(1).strip()
-                # Clean up character name
-                character = re.sub(r'\s+', ' ', character)  # Multiple spaces to single
-                character = character.replace(':', '').strip()
-                
-                # Filter out common false positives
-                if self.is_valid_character_name(character):
-                    return character
+        match = self.character_pattern.match(line)
+        if match:
+            character = match.group(1).strip()
+            # Clean up character name
+            character = " ".join(character.split())  # Multiple spaces to single
+            character = character.replace(':', '').strip()
+            
+            # Filter out common false positives
+            if self.is_valid_character_name(character):
+                return character
         return None
     
     def is_valid_character_name(self, name: str) -> bool:
@@ -84,18 +106,11 @@ class ScriptParser:
             return False
         
         # Common false positives to filter out
-        false_positives = [
-            'THE END', 'TITLE CARD', 'MONTAGE', 'SERIES OF SHOTS',
-            'LATER', 'MEANWHILE', 'SAME TIME', 'MOMENTS LATER',
-            'FLASHBACK', 'DREAM SEQUENCE', 'VOICE OVER', 'V.O.',
-            'O.S.', 'OFF SCREEN', 'NARRATION'
-        ]
-        
-        if name.upper() in false_positives:
+        if name.upper() in _FALSE_POSITIVES:
             return False
         
         # Must contain at least one letter
-        if not re.search(r'[A-Za-z]', name):
+        if not _LETTER_RE.search(name):
             return False
         
         return True
@@ -108,59 +123,55 @@ class ScriptParser:
         text = self.extract_text_from_pdf(pdf_file)
         lines = text.split('\n')
         
-        script_data = {}
+        script_data = defaultdict(list)
         current_character = None
         current_dialogue = []
         
+        # Each line is stripped once here; the checks below all work on the stripped line
+        ignore_match = self.ignore_pattern.match
+        character_name = self._character_name
+        clean_dialogue_line = self.clean_dialogue_line
+        
         for line in lines:
             line = line.strip()
             
             # Skip empty lines and ignored patterns
-            if self.should_ignore_line(line):
+            if not line or ignore_match(line):
                 continue
             
             # Check if this is a character name
-            character = self.is_character_name(line)
+            character = character_name(line)
             if character:
                 # Save previous character's dialogue if exists
                 if current_character and current_dialogue:
-                    if current_character not in script_data:
-                        script_data[current_character] = []
                     script_data[current_character].extend(current_dialogue)
                 
                 # Start new character
                 current_character = character
                 current_dialogue = []
             
-            else:
+            elif current_character:
                 # This is dialogue or stage direction
-                if current_character and line:
-                    # Clean up dialogue line
-                    cleaned_line = self.clean_dialogue_line(line)
-                    if cleaned_line:
-                        current_dialogue.append(cleaned_line)
+                cleaned_line = clean_dialogue_line(line)
+                if cleaned_line:
+                    current_dialogue.append(cleaned_line)
         
         # Don't forget the last character
         if current_character and current_dialogue:
-            if current_character not in script_data:
-                script_data[current_character] = []
             script_data[current_character].extend(current_dialogue)
         
         # Filter out characters with very few lines (likely false positives)
-        filtered_data = {char: lines for char, lines in script_data.items() 
-                        if len(lines) >= 1 and char}
-        
-        return filtered_data
+        return {char: lines for char, lines in script_data.items() if lines and char}
     
     def clean_dialogue_line(self, line: str) -> str:
         """Clean up dialogue line"""
         line = line.strip()
         
         # Remove stage directions in parentheses within dialogue
-        line = re.sub(r'\([^)]*\)', '', line)
+        line = _PAREN_RE.sub('', line)
         
         # Remove extra whitespace
-        line = re.sub(r'\s+', ' ', line).strip()
+        line = " ".join(line.split())
         
         # Skip very short lines that are likely formatting artifacts
         if len(line) < 3:
@@ -170,14 +181,17 @@ class ScriptParser:
     
     def get_script_summary(self, script_data: Dict[str, List[str]]) -> Dict:
         """Get summary statistics of the parsed script"""
-        total_lines = sum(len(lines) for lines in script_data.values())
+        total_lines = 0
         character_count = len(script_data)
         
         character_stats = {}
         for char, lines in script_data.items():
+            total_lines += len(lines)
+            # Parsed dialogue lines are stripped and single-spaced, so the
+            # word count is the number of spaces plus one per line
             character_stats[char] = {
                 'line_count': len(lines),
-                'total_words': sum(len(line.split()) for line in lines),
+                'total_words': sum(line.count(' ') for line in lines) + len(lines),
                 'sample_line': lines[0] if lines else ""
             }
         
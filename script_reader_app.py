@@ -2,25 +2,155 @@
 Simplified Film Script Reader - Fixed Gradio Web Interface
 Upload PDF scripts, extract characters and dialogue, and convert to speech using ChatterboxTTS
 """
+import os
+# Growable CUDA segments keep long conversions from fragmenting the allocator;
+# this has to be set before torch initializes CUDA
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
 import gradio as gr
 import tempfile
 import zipfile
-import os
-from script_parser import ScriptParser
+import functools
+import threading
+import hashlib
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from script_parser import PARSER_VERSION, ScriptParser, ScriptView
+from tts_utils import compile_model, enable_mixed_precision, keep_builtin_conds, store_wav
 from chatterbox.tts import ChatterboxTTS
 import torch
 
 # Initialize components
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+NUM_GPUS = torch.cuda.device_count()
+DEVICE = "cuda" if NUM_GPUS else "cpu"
+# One model replica per visible GPU; a character's lines are sharded across them
+DEVICES = [f"cuda:{i}" for i in range(NUM_GPUS)] if NUM_GPUS > 1 else [DEVICE]
+NUM_SLOTS = 3  # Characters shown in the UI
+EMPTY_CACHE_LINES = 32  # Lines generated between CUDA cache flushes
 script_parser = ScriptParser()
-tts_model = None
+tts_models = {}
+model_load_locks = {device: threading.Lock() for device in DEVICES}
+# Voice conditionals live on each shared replica
+generation_locks = {device: threading.Lock() for device in DEVICES}
+
+# Parsed scripts keyed by parser version and the sha256 of the PDF contents
+SCRIPT_CACHE_SIZE = 32
+# Per-user, not the shared temp dir, so other local users can't plant results
+SCRIPT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "chatterbox", "scripts"
+)
+script_cache = OrderedDict()
+# Gradio runs handlers in worker threads; the LRU reorders itself on every hit
+script_cache_lock = threading.Lock()
+
+def warm_up(model):
+    """Generate with the built-in voice so compilation happens before the first request"""
+    if model.conds is not None:
+        model.generate("Warming up the voice model.")
+
+def load_tts_model(device=None):
+    """Load the TTS model replica for a device once"""
+    device = device or DEVICES[0]
+    if device not in tts_models:
+        # Callers block here only while the startup preload is still running
+        with model_load_locks[device]:
+            if device not in tts_models:
+                model = keep_builtin_conds(enable_mixed_precision(ChatterboxTTS.from_pretrained(device), device))
+                tts_models[device] = compile_model(model, device, warmup=warm_up)
+    return tts_models[device]
+
+def preload_models():
+    """Load and warm up every replica in the background so the first conversion finds them ready"""
+    for device in DEVICES:
+        threading.Thread(target=load_tts_model, args=(device,), daemon=True).start()
 
-def load_tts_model():
-    """Load TTS model once"""
-    global tts_model
-    if tts_model is None:
-        tts_model = ChatterboxTTS.from_pretrained(DEVICE)
-    return tts_model
+@functools.lru_cache(maxsize=32)
+def get_prompt_conditionals(path, mtime, exaggeration=0.5, device=None):
+    """Reference voice conditionals, cached per file, modification time and device"""
+    model = load_tts_model(device)
+    model.prepare_conditionals(path, exaggeration=exaggeration)
+    return model.conds
+
+def prompt_conditionals(path, exaggeration=0.5, device=None):
+    """Get conditionals for a reference voice file; re-encodes it if the file changes"""
+    path = os.path.abspath(path)
+    return get_prompt_conditionals(path, os.path.getmtime(path), exaggeration, device or DEVICES[0])
+
+def pdf_path(pdf_file):
+    """Get the on-disk path of an uploaded PDF"""
+    return pdf_file if isinstance(pdf_file, str) else pdf_file.name
+
+def hash_file(path):
+    """sha256 of a file, read in chunks so large PDFs are never fully buffered"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parse_script_cached(path):
+    """Parse a PDF, reusing earlier results for identical files"""
+    key = f"v{PARSER_VERSION}-{hash_file(path)}"
+    with script_cache_lock:
+        if key in script_cache:
+            script_cache.move_to_end(key)
+            return script_cache[key]
+    
+    cache_path = os.path.join(SCRIPT_CACHE_DIR, f"{key}.json")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            script_data = json.load(f)
+    except (OSError, ValueError):
+        script_data = script_parser.parse_script(path)
+        try:
+            os.makedirs(SCRIPT_CACHE_DIR, mode=0o700, exist_ok=True)
+            with open(cache_path, 'w', encoding='utf-8') as f:
+                json.dump(script_data, f)
+        except OSError as e:
+            print(f"Could not write script cache: {e}")
+    
+    with script_cache_lock:
+        script_cache[key] = script_data
+        if len(script_cache) > SCRIPT_CACHE_SIZE:
+            script_cache.popitem(last=False)
+    return script_data
+
+def shard_by_length(lines, num_shards):
+    """Split (line number, text) pairs into contiguous shards of similar total length"""
+    total = sum(len(text) for _, text in lines)
+    shards, shard, size = [], [], 0
+    for item in lines:
+        shard.append(item)
+        size += len(item[1])
+        if len(shards) < num_shards - 1 and size >= total * (len(shards) + 1) / num_shards:
+            shards.append(shard)
+            shard = []
+    if shard:
+        shards.append(shard)
+    return shards
+
+def generate_shard(device, lines, reference_audio, on_wav):
+    """Generate speech for a shard of lines on one replica, passing each result to on_wav"""
+    # inference_mode is thread-local, so it is entered here in the shard's own thread
+    with generation_locks[device], torch.inference_mode():
+        model = load_tts_model(device)
+        # Encode the reference voice once and reuse it for all of this shard's lines
+        model.conds = prompt_conditionals(reference_audio, exaggeration=0.5, device=device)
+        
+        for n, (i, line) in enumerate(lines, 1):
+            # Generate speech for this line
+            wav = model.generate(
+                line,
+                exaggeration=0.5,
+                temperature=0.8,
+            )
+            on_wav(i, wav, model.sr)
+            del wav
+            
+            # Return freed blocks periodically so hundreds of differently sized
+            # lines don't fragment the cache into an OOM on long scripts
+            if n % EMPTY_CACHE_LINES == 0 and device != "cpu":
+                torch.cuda.empty_cache()
 
 def process_script_pdf(pdf_file):
     """Process uploaded PDF and extract characters/dialogue"""
@@ -28,8 +158,8 @@ def process_script_pdf(pdf_file):
         return "Please upload a PDF file", {}
     
     try:
-        # Parse the script
-        script_data = script_parser.parse_script(pdf_file)
+        # Parse the script (cached by file contents)
+        script_data = parse_script_cached(pdf_path(pdf_file))
         
         if not script_data:
             return "No characters or dialogue found in the PDF. Please check the format.", {}
@@ -60,160 +190,73 @@ def convert_character_dialogue(character, dialogue_lines, reference_audio):
     if not dialogue_lines or not reference_audio:
         return None, None
     
-    # Load TTS model
-    model = load_tts_model()
-    
-    audio_files = []
     temp_dir = tempfile.mkdtemp()
+    zip_path = os.path.join(temp_dir, f"{character}_all_lines.zip")
     
     try:        
-        for i, line in enumerate(dialogue_lines):
-            if len(line.strip()) < 3:  # Skip very short lines
-                continue
+        # Keep the line numbers so file names follow script order. ScriptParser
+        # already drops lines too short to voice, so every line is generated.
+        lines = list(enumerate(dialogue_lines))
+        # Only the first line is kept on disk, for the preview player
+        preview_index = 0
+        name_prefix = f"{character}_line_"
+        first_audio = os.path.join(temp_dir, f"{name_prefix}001.wav")
+        
+        # WAVs are streamed into the zip in the background while the next lines
+        # generate. ZipFile is not thread-safe, so a single writer is used, and
+        # entries are stored uncompressed since PCM audio barely deflates.
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_STORED) as zipf, \
+                ThreadPoolExecutor(max_workers=1) as writer:
+            futures = []
             
-            # Generate speech for this line
-            wav = model.generate(
-                line,
-                audio_prompt_path=reference_audio,
-                exaggeration=0.5,
-                temperature=0.8,
-            )
+            def on_wav(i, wav, sample_rate):
+                name = f"{name_prefix}{i+1:03d}.wav"
+                preview_path = first_audio if i == preview_index else None
+                futures.append(writer.submit(store_wav, zipf, name, wav, sample_rate, preview_path))
             
-            # Save to temporary file
-            audio_path = os.path.join(temp_dir, f"{character}_line_{i+1:03d}.wav")
-            import soundfile as sf
-            sf.write(audio_path, wav.squeeze(0).numpy(), model.sr)
-            audio_files.append(audio_path)
-        
-        # Create zip file with all audio
-        zip_path = os.path.join(temp_dir, f"{character}_all_lines.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for audio_file in audio_files:
-                zipf.write(audio_file, os.path.basename(audio_file))
+            # Each GPU replica works through its own contiguous shard of the lines
+            shards = shard_by_length(lines, len(DEVICES))
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                shard_futures = [pool.submit(generate_shard, device, shard, reference_audio, on_wav)
+                                 for device, shard in zip(DEVICES, shards)]
+            
+            for future in shard_futures + futures:
+                future.result()
         
         # Return first audio file for preview and zip for download
-        first_audio = audio_files[0] if audio_files else None
-        
         return first_audio, zip_path
         
     except Exception as e:
         print(f"Error converting dialogue: {e}")
         return None, None
 
-def update_character_display(script_data):
-    """Update the character display based on script data"""
-    if not script_data:
-        return [gr.update(visible=False)] * 12
-    
-    characters = list(script_data.keys())
+def update_character_display(view):
+    """Update the character display based on the parsed script view"""
     updates = []
-    
-    # Character 1
-    if len(characters) >= 1:
-        char_name = characters[0]
-        dialogue_lines = script_data[char_name]
-        preview_text = "\n".join(dialogue_lines[:3])
-        if len(dialogue_lines) > 3:
-            preview_text += f"\n... and {len(dialogue_lines) - 3} more lines"
-        
-        updates.extend([
-            gr.update(visible=True, value=f"### 🎭 {char_name} ({len(dialogue_lines)} lines)"),
-            gr.update(visible=True, value=preview_text),
-            gr.update(visible=True),  # ref_audio
-            gr.update(visible=True, value=f"🎤 Convert {char_name}'s Lines")
-        ])
-    else:
-        updates.extend([gr.update(visible=False)] * 4)
-    
-    # Character 2
-    if len(characters) >= 2:
-        char_name = characters[1]
-        dialogue_lines = script_data[char_name]
-        preview_text = "\n".join(dialogue_lines[:3])
-        if len(dialogue_lines) > 3:
-            preview_text += f"\n... and {len(dialogue_lines) - 3} more lines"
-        
+    shown = min(len(view.names), NUM_SLOTS) if view else 0
+    for idx in range(shown):
+        char_name = view.names[idx]
         updates.extend([
-            gr.update(visible=True, value=f"### 🎭 {char_name} ({len(dialogue_lines)} lines)"),
-            gr.update(visible=True, value=preview_text),
+            gr.update(visible=True, value=f"### 🎭 {char_name} ({len(view.lines[idx])} lines)"),
+            gr.update(visible=True, value=view.previews[idx]),
             gr.update(visible=True),  # ref_audio
             gr.update(visible=True, value=f"🎤 Convert {char_name}'s Lines")
         ])
-    else:
-        updates.extend([gr.update(visible=False)] * 4)
-    
-    # Character 3
-    if len(characters) >= 3:
-        char_name = characters[2]
-        dialogue_lines = script_data[char_name]
-        preview_text = "\n".join(dialogue_lines[:3])
-        if len(dialogue_lines) > 3:
-            preview_text += f"\n... and {len(dialogue_lines) - 3} more lines"
-        
-        updates.extend([
-            gr.update(visible=True, value=f"### 🎭 {char_name} ({len(dialogue_lines)} lines)"),
-            gr.update(visible=True, value=preview_text),
-            gr.update(visible=True),  # ref_audio
-            gr.update(visible=True, value=f"🎤 Convert {char_name}'s Lines")
-        ])
-    else:
-        updates.extend([gr.update(visible=False)] * 4)
     
+    # Hide the slots without a character
+    updates.extend([gr.update(visible=False)] * (4 * (NUM_SLOTS - shown)))
     return updates
 
-def convert_char_1(ref_audio, script_data):
-    """Convert character 1's dialogue"""
-    if not script_data or not ref_audio:
+def convert_char(idx, ref_audio, view):
+    """Convert the dialogue of the character shown in slot idx"""
+    if not view or not ref_audio:
         return "❌ Please upload reference audio", None, gr.update(visible=False), gr.update(visible=False)
     
-    characters = list(script_data.keys())
-    if len(characters) < 1:
+    if idx >= len(view.names):
         return "❌ No character found", None, gr.update(visible=False), gr.update(visible=False)
     
-    char_name = characters[0]
-    dialogue_lines = script_data[char_name]
-    
-    try:
-        preview_audio, download_zip = convert_character_dialogue(char_name, dialogue_lines, ref_audio)
-        if preview_audio and download_zip:
-            return f"✅ Generated {len(dialogue_lines)} audio files for {char_name}!", preview_audio, gr.update(visible=True), gr.update(visible=True)
-        else:
-            return "❌ Conversion failed", None, gr.update(visible=False), gr.update(visible=False)
-    except Exception as e:
-        return f"❌ Error: {str(e)}", None, gr.update(visible=False), gr.update(visible=False)
-
-def convert_char_2(ref_audio, script_data):
-    """Convert character 2's dialogue"""
-    if not script_data or not ref_audio:
-        return "❌ Please upload reference audio", None, gr.update(visible=False), gr.update(visible=False)
-    
-    characters = list(script_data.keys())
-    if len(characters) < 2:
-        return "❌ No character found", None, gr.update(visible=False), gr.update(visible=False)
-    
-    char_name = characters[1]
-    dialogue_lines = script_data[char_name]
-    
-    try:
-        preview_audio, download_zip = convert_character_dialogue(char_name, dialogue_lines, ref_audio)
-        if preview_audio and download_zip:
-            return f"✅ Generated {len(dialogue_lines)} audio files for {char_name}!", preview_audio, gr.update(visible=True), gr.update(visible=True)
-        else:
-            return "❌ Conversion failed", None, gr.update(visible=False), gr.update(visible=False)
-    except Exception as e:
-        return f"❌ Error: {str(e)}", None, gr.update(visible=False), gr.update(visible=False)
-
-def convert_char_3(ref_audio, script_data):
-    """Convert character 3's dialogue"""
-    if not script_data or not ref_audio:
-        return "❌ Please upload reference audio", None, gr.update(visible=False), gr.update(visible=False)
-    
-    characters = list(script_data.keys())
-    if len(characters) < 3:
-        return "❌ No character found", None, gr.update(visible=False), gr.update(visible=False)
-    
-    char_name = characters[2]
-    dialogue_lines = script_data[char_name]
+    char_name = view.names[idx]
+    dialogue_lines = view.lines[idx]
     
     try:
         preview_audio, download_zip = convert_character_dialogue(char_name, dialogue_lines, ref_audio)
@@ -241,7 +284,7 @@ with gr.Blocks(title="🎬 Film Script Reader & TTS Converter", theme=gr.themes.
     # Step 1: Upload and Process Script
     gr.Markdown("### 📁 Step 1: Upload Script")
     with gr.Row():
-        pdf_input = gr.File(file_types=[".pdf"], label="Upload PDF Film Script")
+        pdf_input = gr.File(file_types=[".pdf"], type="filepath", label="Upload PDF Film Script")
         process_btn = gr.Button("📖 Process Script", variant="primary")
     
     # Script Analysis Results
@@ -251,92 +294,57 @@ with gr.Blocks(title="🎬 Film Script Reader & TTS Converter", theme=gr.themes.
     # Step 2: Character Processing
     gr.Markdown("### 🎭 Step 2: Character Voice Assignment & Conversion")
     
-    # Character 1
-    with gr.Group():
-        char1_name = gr.Markdown("### Character 1", visible=False)
-        with gr.Row():
-            with gr.Column():
-                char1_dialogue = gr.Textbox(label="Dialogue Preview", lines=4, interactive=False, visible=False)
-                char1_ref_audio = gr.Audio(sources=["upload", "microphone"], type="filepath", label="Reference Voice", visible=False)
-            with gr.Column():
-                char1_convert_btn = gr.Button("🎤 Convert Lines", variant="primary", visible=False)
-                char1_status = gr.Textbox(label="Status", value="Ready", interactive=False)
-                char1_preview = gr.Audio(label="Preview", visible=False)
-                char1_download = gr.File(label="Download Audio Files", visible=False)
-    
-    # Character 2
-    with gr.Group():
-        char2_name = gr.Markdown("### Character 2", visible=False)
-        with gr.Row():
-            with gr.Column():
-                char2_dialogue = gr.Textbox(label="Dialogue Preview", lines=4, interactive=False, visible=False)
-                char2_ref_audio = gr.Audio(sources=["upload", "microphone"], type="filepath", label="Reference Voice", visible=False)
-            with gr.Column():
-                char2_convert_btn = gr.Button("🎤 Convert Lines", variant="primary", visible=False)
-                char2_status = gr.Textbox(label="Status", value="Ready", interactive=False)
-                char2_preview = gr.Audio(label="Preview", visible=False)
-                char2_download = gr.File(label="Download Audio Files", visible=False)
-    
-    # Character 3
-    with gr.Group():
-        char3_name = gr.Markdown("### Character 3", visible=False)
-        with gr.Row():
-            with gr.Column():
-                char3_dialogue = gr.Textbox(label="Dialogue Preview", lines=4, interactive=False, visible=False)
-                char3_ref_audio = gr.Audio(sources=["upload", "microphone"], type="filepath", label="Reference Voice", visible=False)
-            with gr.Column():
-                char3_convert_btn = gr.Button("🎤 Convert Lines", variant="primary", visible=False)
-                char3_status = gr.Textbox(label="Status", value="Ready", interactive=False)
-                char3_preview = gr.Audio(label="Preview", visible=False)
-                char3_download = gr.File(label="Download Audio Files", visible=False)
-    
-    # Hidden state to store script data
-    script_data_state = gr.State({})
+    # One slot per character
+    slots = []
+    for slot in range(1, NUM_SLOTS + 1):
+        with gr.Group():
+            char_name = gr.Markdown(f"### Character {slot}", visible=False)
+            with gr.Row():
+                with gr.Column():
+                    char_dialogue = gr.Textbox(label="Dialogue Preview", lines=4, interactive=False, visible=False)
+                    char_ref_audio = gr.Audio(sources=["upload", "microphone"], type="filepath", label="Reference Voice", visible=False)
+                with gr.Column():
+                    char_convert_btn = gr.Button("🎤 Convert Lines", variant="primary", visible=False)
+                    char_status = gr.Textbox(label="Status", value="Ready", interactive=False)
+                    char_preview = gr.Audio(label="Preview", visible=False)
+                    char_download = gr.File(label="Download Audio Files", visible=False)
+        slots.append((char_name, char_dialogue, char_ref_audio, char_convert_btn,
+                      char_status, char_preview, char_download))
+    
+    # Hidden state to store the parsed script
+    script_view_state = gr.State(None)
     
     # Process script function
     def on_process_script(pdf_file):
         summary_text, script_data = process_script_pdf(pdf_file)
         
         if not script_data:
-            return [summary_text, {}] + [gr.update(visible=False)] * 12
+            return [summary_text, None] + [gr.update(visible=False)] * (4 * NUM_SLOTS)
         
-        # Update character displays
-        character_updates = update_character_display(script_data)
-        return [summary_text, script_data] + character_updates
+        # Build the index-addressable view once; every later callback reads from it
+        view = ScriptView.from_script_data(script_data)
+        return [summary_text, view] + update_character_display(view)
     
     # Event handlers
     process_btn.click(
         fn=on_process_script,
         inputs=[pdf_input],
-        outputs=[
-            analysis_output, script_data_state,
+        outputs=[analysis_output, script_view_state] + [
             # Character outputs
-            char1_name, char1_dialogue, char1_ref_audio, char1_convert_btn,
-            char2_name, char2_dialogue, char2_ref_audio, char2_convert_btn,
-            char3_name, char3_dialogue, char3_ref_audio, char3_convert_btn
+            component for slot_components in slots for component in slot_components[:4]
         ]
     )
     
     # Character conversion buttons
-    char1_convert_btn.click(
-        fn=convert_char_1,
-        inputs=[char1_ref_audio, script_data_state],
-        outputs=[char1_status, char1_preview, char1_preview, char1_download]
-    )
-    
-    char2_convert_btn.click(
-        fn=convert_char_2,
-        inputs=[char2_ref_audio, script_data_state],
-        outputs=[char2_status, char2_preview, char2_preview, char2_download]
-    )
-    
-    char3_convert_btn.click(
-        fn=convert_char_3,
-        inputs=[char3_ref_audio, script_data_state],
-        outputs=[char3_status, char3_preview, char3_preview, char3_download]
-    )
+    for idx, (_, _, char_ref_audio, char_convert_btn, char_status, char_preview, char_download) in enumerate(slots):
+        char_convert_btn.click(
+            fn=functools.partial(convert_char, idx),
+            inputs=[char_ref_audio, script_view_state],
+            outputs=[char_status, char_preview, char_preview, char_download]
+        )
 
 if __name__ == "__main__":
+    preload_models()
     app.launch(
         server_name="0.0.0.0", 
         server_port=7862, 
@@ -2,21 +2,28 @@
 Script Reader with Tortoise TTS backend.
 Reuses script parsing and lets users assign characters to voice samples.
 """
+import functools
 import inspect
 import os
 import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Growable CUDA segments keep long conversions from fragmenting the allocator;
+# this has to be set before torch initializes CUDA
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
 
 import gradio as gr
-import numpy as np
 import torch
 
-from script_parser import ScriptParser
+from script_parser import ScriptParser, ScriptView
+from tts_utils import store_wav
 
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 DEFAULT_PRESET = "high_quality"
 FALLBACK_SAMPLE_RATE = 24000
+EMPTY_CACHE_LINES = 32  # Lines generated between CUDA cache flushes
 
 script_parser = ScriptParser()
 tts_model = None
@@ -60,10 +67,34 @@ def get_sample_rate(tts):
     return getattr(tts, "sample_rate", FALLBACK_SAMPLE_RATE)
 
 
-def tts_generate(tts, text, voice_samples, preset):
+def get_conditioning_latents(tts, voice_samples):
+    """Encode the reference voice once so every line can reuse it."""
+    if hasattr(tts, "get_conditioning_latents"):
+        return tts.get_conditioning_latents(voice_samples)
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def get_voice_conditioning(path, mtime, sample_rate):
+    """Voice samples and conditioning latents, cached per file and modification time."""
+    tts = load_tortoise()
+    voice_samples = load_voice_samples(path, sample_rate)
+    return voice_samples, get_conditioning_latents(tts, voice_samples)
+
+
+def voice_conditioning(path, sample_rate):
+    path = os.path.abspath(path)
+    return get_voice_conditioning(path, os.path.getmtime(path), sample_rate)
+
+
+def tts_generate(tts, text, voice_samples, preset, conditioning_latents=None):
+    if conditioning_latents is not None:
+        voice_kwargs = {"conditioning_latents": conditioning_latents}
+    else:
+        voice_kwargs = {"voice_samples": voice_samples}
     if hasattr(tts, "tts_with_preset"):
-        return tts.tts_with_preset(text, voice_samples=voice_samples, preset=preset)
-    return tts.tts(text, voice_samples=voice_samples)
+        return tts.tts_with_preset(text, preset=preset, **voice_kwargs)
+    return tts.tts(text, **voice_kwargs)
 
 
 def process_script_pdf(pdf_file):
@@ -91,19 +122,14 @@ def process_script_pdf(pdf_file):
         return f"Error processing PDF: {exc}", {}
 
 
-def preview_text_for_character(character_name, script_data):
-    if not character_name or character_name not in script_data:
+def preview_text_for_character(character_idx, view):
+    if view is None or character_idx is None:
         return ""
-    lines = script_data[character_name]
-    preview = "\n".join(lines[:3])
-    if len(lines) > 3:
-        preview += f"\n... and {len(lines) - 3} more lines"
-    return preview
+    return view.previews[character_idx]
 
 
-def default_characters(script_data, slots=3):
-    characters = list(script_data.keys())
-    defaults = characters[:slots]
+def default_characters(view, slots=3):
+    defaults = list(range(min(len(view.names), slots)))
     while len(defaults) < slots:
         defaults.append(None)
     return defaults
@@ -115,50 +141,57 @@ def convert_character_dialogue(character, dialogue_lines, reference_audio, prese
 
     tts = load_tortoise()
     sample_rate = get_sample_rate(tts)
-    voice_samples = load_voice_samples(reference_audio, sample_rate)
+    voice_samples, conditioning_latents = voice_conditioning(reference_audio, sample_rate)
 
-    audio_files = []
     temp_dir = tempfile.mkdtemp()
-    for idx, line in enumerate(dialogue_lines):
-        if len(line.strip()) < 3:
-            continue
-        wav = tts_generate(tts, line, voice_samples=voice_samples, preset=preset)
-        if torch.is_tensor(wav):
-            wav = wav.squeeze(0).detach().cpu().numpy()
-        else:
-            wav = np.asarray(wav).squeeze()
-        audio_path = os.path.join(temp_dir, f"{character}_line_{idx + 1:03d}.wav")
-        import soundfile as sf
-
-        sf.write(audio_path, wav, sample_rate)
-        audio_files.append(audio_path)
-
-    if not audio_files:
-        return None, None
-
     zip_path = os.path.join(temp_dir, f"{character}_all_lines.zip")
-    with zipfile.ZipFile(zip_path, "w") as zipf:
-        for audio_file in audio_files:
-            zipf.write(audio_file, os.path.basename(audio_file))
-
-    return audio_files[0], zip_path
-
-
-def convert_slot(character_name, reference_audio, preset, script_data):
-    if not script_data:
+    name_prefix = f"{character}_line_"
+    preview_path = os.path.join(temp_dir, f"{name_prefix}001.wav")
+
+    # WAVs are written straight into the zip, stored uncompressed since PCM barely
+    # deflates; only the first line is also saved to disk for the preview player.
+    # Encoding and zip writes run on a single background writer (ZipFile is not
+    # thread-safe) so they overlap with generation of the next line.
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zipf:
+        with ThreadPoolExecutor(max_workers=1) as writer, torch.inference_mode():
+            futures = []
+            # ScriptParser already drops lines too short to voice, so every line is generated
+            for idx, line in enumerate(dialogue_lines):
+                wav = tts_generate(
+                    tts, line, voice_samples=voice_samples, preset=preset, conditioning_latents=conditioning_latents
+                )
+                name = f"{name_prefix}{idx + 1:03d}.wav"
+                line_preview = preview_path if idx == 0 else None
+                futures.append(writer.submit(store_wav, zipf, name, wav, sample_rate, line_preview))
+                del wav
+
+                # Periodically return freed blocks so long scripts don't fragment the cache into an OOM
+                if (idx + 1) % EMPTY_CACHE_LINES == 0 and DEVICE == "cuda":
+                    torch.cuda.empty_cache()
+
+            for future in futures:
+                future.result()
+
+    return preview_path, zip_path
+
+
+def convert_slot(character_idx, reference_audio, preset, view):
+    if view is None:
         return "Please process a script first.", None, gr.update(visible=False), gr.update(visible=False)
-    if not character_name or character_name not in script_data:
+    if character_idx is None:
         return "Please select a character.", None, gr.update(visible=False), gr.update(visible=False)
     if not reference_audio:
         return "Please upload a reference voice.", None, gr.update(visible=False), gr.update(visible=False)
 
+    character_name = view.names[character_idx]
+    dialogue_lines = view.lines[character_idx]
     try:
         preview_audio, download_zip = convert_character_dialogue(
-            character_name, script_data[character_name], reference_audio, preset
+            character_name, dialogue_lines, reference_audio, preset
         )
         if preview_audio and download_zip:
             return (
-                f"Generated {len(script_data[character_name])} lines for {character_name}.",
+                f"Generated {len(dialogue_lines)} lines for {character_name}.",
                 preview_audio,
                 gr.update(visible=True),
                 gr.update(visible=True),
@@ -171,19 +204,21 @@ def convert_slot(character_name, reference_audio, preset, script_data):
 def on_process_script(pdf_file):
     summary_text, script_data = process_script_pdf(pdf_file)
     if not script_data:
-        return [summary_text, {}] + [gr.update(visible=False)] * 15
+        return [summary_text, None] + [gr.update(visible=False)] * 15
 
-    defaults = default_characters(script_data, slots=3)
-    choices = list(script_data.keys())
+    # Build the index-addressable view once; the dropdowns carry character indices
+    view = ScriptView.from_script_data(script_data)
+    defaults = default_characters(view, slots=3)
+    choices = [(name, idx) for idx, name in enumerate(view.names)]
     updates = [
         summary_text,
-        script_data,
+        view,
     ]
     for default in defaults:
         updates.extend(
             [
                 gr.update(visible=True, choices=choices, value=default),
-                gr.update(visible=True, value=preview_text_for_character(default, script_data)),
+                gr.update(visible=True, value=preview_text_for_character(default, view)),
                 gr.update(visible=True),
                 gr.update(visible=True, value=DEFAULT_PRESET),
                 gr.update(visible=True, value="Convert lines"),
@@ -192,8 +227,8 @@ def on_process_script(pdf_file):
     return updates
 
 
-def on_character_change(character_name, script_data):
-    return preview_text_for_character(character_name, script_data)
+def on_character_change(character_idx, view):
+    return preview_text_for_character(character_idx, view)
 
 
 with gr.Blocks(title="Script Reader (Tortoise TTS)") as app:
@@ -203,7 +238,7 @@ with gr.Blocks(title="Script Reader (Tortoise TTS)") as app:
 
     gr.Markdown("Step 1: Upload Script")
     with gr.Row():
-        pdf_input = gr.File(file_types=[".pdf"], label="Upload PDF Film Script")
+        pdf_input = gr.File(file_types=[".pdf"], type="filepath", label="Upload PDF Film Script")
         process_btn = gr.Button("Process Script", variant="primary")
 
     gr.Markdown("Script Analysis")
@@ -280,14 +315,14 @@ with gr.Blocks(title="Script Reader (Tortoise TTS)") as app:
         char3_download,
     ) = slot_ui("Slot 3")
 
-    script_data_state = gr.State({})
+    script_view_state = gr.State(None)
 
     process_btn.click(
         fn=on_process_script,
         inputs=[pdf_input],
         outputs=[
             analysis_output,
-            script_data_state,
+            script_view_state,
             char1_dropdown,
             char1_dialogue,
             char1_ref_audio,
@@ -308,33 +343,33 @@ with gr.Blocks(title="Script Reader (Tortoise TTS)") as app:
 
     char1_dropdown.change(
         fn=on_character_change,
-        inputs=[char1_dropdown, script_data_state],
+        inputs=[char1_dropdown, script_view_state],
         outputs=[char1_dialogue],
     )
     char2_dropdown.change(
         fn=on_character_change,
-        inputs=[char2_dropdown, script_data_state],
+        inputs=[char2_dropdown, script_view_state],
         outputs=[char2_dialogue],
     )
     char3_dropdown.change(
         fn=on_character_change,
-        inputs=[char3_dropdown, script_data_state],
+        inputs=[char3_dropdown, script_view_state],
         outputs=[char3_dialogue],
     )
 
     char1_convert_btn.click(
         fn=convert_slot,
-        inputs=[char1_dropdown, char1_ref_audio, char1_preset, script_data_state],
+        inputs=[char1_dropdown, char1_ref_audio, char1_preset, script_view_state],
         outputs=[char1_status, char1_preview, char1_preview, char1_download],
     )
     char2_convert_btn.click(
         fn=convert_slot,
-        inputs=[char2_dropdown, char2_ref_audio, char2_preset, script_data_state],
+        inputs=[char2_dropdown, char2_ref_audio, char2_preset, script_view_state],
         outputs=[char2_status, char2_preview, char2_preview, char2_download],
     )
     char3_convert_btn.click(
         fn=convert_slot,
-        inputs=[char3_dropdown, char3_ref_audio, char3_preset, script_data_state],
+        inputs=[char3_dropdown, char3_ref_audio, char3_preset, script_view_state],
         outputs=[char3_status, char3_preview, char3_preview, char3_download],
     )
 
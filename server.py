@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Single-process server that mounts all Gradio apps on one FastAPI/uvicorn instance.
+Alternative to start_both_services.py: PyTorch is imported once and every app
+shares one CUDA context instead of each service starting its own interpreter.
+"""
+import os
+
+import gradio as gr
+import uvicorn
+from fastapi import FastAPI
+
+import gradio_tts_app
+import gradio_vc_app
+import script_reader_app
+import script_reader_tortoise_app
+
+PORT = int(os.environ.get("PORT", 7860))
+
+
+def create_app():
+    """Mount every UI under its own path on one FastAPI app"""
+    fastapi_app = FastAPI()
+    # Serve /tts from the script reader's first replica instead of loading a second
+    # copy; sharing its generation lock keeps the two UIs from swapping voices mid-call
+    gradio_tts_app.model_loader = script_reader_app.load_tts_model
+    gradio_tts_app.generation_lock = script_reader_app.generation_locks[script_reader_app.DEVICES[0]]
+    gr.mount_gradio_app(fastapi_app, gradio_tts_app.demo.queue(max_size=50, default_concurrency_limit=1), path="/tts")
+    gr.mount_gradio_app(fastapi_app, gradio_vc_app.demo, path="/vc")
+    gr.mount_gradio_app(fastapi_app, script_reader_app.app, path="/script")
+    gr.mount_gradio_app(fastapi_app, script_reader_tortoise_app.app, path="/tortoise")
+    return fastapi_app
+
+
+def main():
+    script_reader_app.preload_models()
+
+    print("🚀 Starting Chatterbox Services (single process)...")
+    print("=" * 50)
+    print(f"🎤 TTS Service (Text-to-Speech):     https://kaizen:{PORT}/tts")
+    print(f"🔄 VC Service (Voice Conversion):    https://kaizen:{PORT}/vc")
+    print(f"🎬 Script Reader (PDF to Speech):    https://kaizen:{PORT}/script")
+    print(f"🎬 Script Reader (Tortoise TTS):     https://kaizen:{PORT}/tortoise")
+    print("=" * 50)
+
+    uvicorn.run(
+        create_app(),
+        host="0.0.0.0",
+        port=PORT,
+        ssl_keyfile="key.pem",
+        ssl_certfile="cert.pem",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,48 +3,140 @@
 Startup script to run both TTS and Voice Conversion services on different ports
 """
 import subprocess
-import time
 import sys
+import select
 import signal
 import os
+import socket
+import threading
+import time
+
+# Handled by a dedicated thread via sigwait, so they're blocked everywhere else
+SHUTDOWN_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+def request_shutdown(shutdown, wakeup_fd):
+    """Flag the shutdown and wake the main thread"""
+    shutdown.set()
+    os.write(wakeup_fd, b"\0")
 
-def signal_handler(sig, frame):
-    print('\nShutting down services...')
-    sys.exit(0)
+def wait_for_signal(shutdown, wakeup_fd):
+    """Wait for SIGINT/SIGTERM, then request the shutdown"""
+    signal.sigwait(SHUTDOWN_SIGNALS)
+    request_shutdown(shutdown, wakeup_fd)
+
+def drain_output(process, service_name):
+    """Copy a service's output to ours line by line, tagged with the service name"""
+    for line in process.stdout:
+        print(f"[{service_name}] {line}", end="", flush=True)
 
 def start_service(script_name, port, service_name):
     """Start a service and return the process"""
     print(f"Starting {service_name} on port {port}...")
-    process = subprocess.Popen([
-        sys.executable, script_name
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    # Children inherit the signal mask; unblock while spawning so the service can be stopped
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, SHUTDOWN_SIGNALS)
+    try:
+        process = subprocess.Popen([
+            sys.executable, script_name
+        ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace",
+            env={**os.environ, "PYTHONUNBUFFERED": "1"},
+            # Own process group, so shutdown also reaches any workers the service spawns
+            start_new_session=True)
+    finally:
+        signal.pthread_sigmask(signal.SIG_BLOCK, SHUTDOWN_SIGNALS)
+    # The pipe must be read continuously, or the service blocks once its buffer fills
+    threading.Thread(target=drain_output, args=(process, service_name), daemon=True).start()
     return process
 
+def wait_port(port, process, shutdown, timeout=120):
+    """Poll until the service accepts connections; False if it exits, times out or we shut down first"""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while time.monotonic() < deadline and process.poll() is None and not shutdown.is_set():
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return True
+        except OSError:
+            shutdown.wait(delay)
+            delay = min(delay * 1.5, 0.2)
+    return False
+
+def wait_for_exit(services, wakeup_fd):
+    """Block until one of the services exits or wakeup_fd is written to.
+
+    Returns the exited service's name and exit code, or None on wakeup.
+    """
+    pidfds = {}
+    try:
+        try:
+            for process, name in services:
+                pidfds[os.pidfd_open(process.pid)] = (process, name)
+        except (AttributeError, OSError):
+            # No pidfds (Python < 3.9 or Linux < 5.3): check the services once a second
+            while not select.select([wakeup_fd], [], [], 1)[0]:
+                for process, name in services:
+                    if process.poll() is not None:
+                        return name, process.returncode
+            return None
+        
+        # A pidfd becomes readable when its process exits, so this sleeps until then
+        ready, _, _ = select.select([wakeup_fd, *pidfds], [], [])
+        if wakeup_fd in ready:
+            return None
+        process, name = pidfds[ready[0]]
+        return name, process.wait()
+    finally:
+        for fd in pidfds:
+            os.close(fd)
+
+def signal_group(process, sig):
+    """Send a signal to the service's whole process group"""
+    try:
+        # start_new_session makes the service its group's leader, so pgid == pid
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+def stop_services(services, timeout=5):
+    """Terminate every running service at once, then force kill any still up after the timeout"""
+    running = [(process, name) for process, name in services if process.poll() is None]
+    for process, name in running:
+        print(f"Terminating {name} service...")
+        signal_group(process, signal.SIGTERM)
+    
+    # One shared deadline, so a hung service doesn't add its timeout to the others'
+    deadline = time.monotonic() + timeout
+    for process, name in running:
+        try:
+            process.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            print(f"Force killing {name} service...")
+            signal_group(process, signal.SIGKILL)
+            process.wait()
+
 def main():
+    shutdown = threading.Event()
+    wakeup_r, wakeup_w = os.pipe()
+    # The handler only covers the moments the signals are unblocked to spawn a service.
+    # It just requests the shutdown, so main() still tracks and stops every service it started.
+    signal_handler = lambda sig, frame: request_shutdown(shutdown, wakeup_w)
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    signal.pthread_sigmask(signal.SIG_BLOCK, SHUTDOWN_SIGNALS)
+    threading.Thread(target=wait_for_signal, args=(shutdown, wakeup_w), daemon=True).start()
     
     print("🚀 Starting Chatterbox Services...")
     print("=" * 50)
     
+    # The services are independent and Popen doesn't block, so start them all at once
     # Start TTS service on port 7860
     tts_process = start_service("gradio_tts_app.py", 7860, "TTS Service")
     
-    # Wait a moment before starting the second service
-    time.sleep(3)
-    
     # Start Voice Conversion service on port 7861
     vc_process = start_service("gradio_vc_app.py", 7861, "Voice Conversion Service")
     
-    # Wait a moment before starting the third service
-    time.sleep(3)
-    
     # Start Script Reader service on port 7862
     script_process = start_service("script_reader_app.py", 7862, "Script Reader Service")
 
-    # Wait a moment before starting the Tortoise script reader
-    time.sleep(3)
-
     # Start Tortoise Script Reader service on port 7863
     tortoise_script_process = start_service(
         "script_reader_tortoise_app.py",
@@ -52,58 +144,48 @@ def main():
         "Script Reader Service (Tortoise)",
     )
     
-    print("✅ All services started!")
-    print("=" * 50)
-    print("🎤 TTS Service (Text-to-Speech):     http://kaizen:7860")
-    print("🔄 VC Service (Voice Conversion):    http://kaizen:7861")
-    print("🎬 Script Reader (PDF to Speech):    http://kaizen:7862")
-    print("🎬 Script Reader (Tortoise TTS):     http://kaizen:7863")
-    print("=" * 50)
-    print("Press Ctrl+C to stop all services")
+    services = [
+        (tts_process, "TTS"),
+        (vc_process, "VC"),
+        (script_process, "Script Reader"),
+        (tortoise_script_process, "Script Reader (Tortoise)"),
+    ]
     
     try:
-        # Keep the script running and monitor processes
-        while True:
-            # Check if processes are still running
-            tts_poll = tts_process.poll()
-            vc_poll = vc_process.poll()
-            script_poll = script_process.poll()
-            tortoise_poll = tortoise_script_process.poll()
-            
-            if tts_poll is not None:
-                print(f"⚠️  TTS service exited with code {tts_poll}")
-                break
-            if vc_poll is not None:
-                print(f"⚠️  VC service exited with code {vc_poll}")
-                break
-            if script_poll is not None:
-                print(f"⚠️  Script Reader service exited with code {script_poll}")
-                break
-            if tortoise_poll is not None:
-                print(f"⚠️  Tortoise Script Reader service exited with code {tortoise_poll}")
-                break
-                
-            time.sleep(1)
-            
+        # The services boot in parallel, so waiting on each in turn costs only the slowest
+        for process, port, name in (
+            (tts_process, 7860, "TTS Service"),
+            (vc_process, 7861, "Voice Conversion Service"),
+            (script_process, 7862, "Script Reader Service"),
+            (tortoise_script_process, 7863, "Script Reader Service (Tortoise)"),
+        ):
+            if not wait_port(port, process, shutdown) and not shutdown.is_set():
+                print(f"⚠️  {name} is not accepting connections on port {port}")
+        
+        if not shutdown.is_set():
+            print("✅ All services started!")
+            print("=" * 50)
+            print("🎤 TTS Service (Text-to-Speech):     http://kaizen:7860")
+            print("🔄 VC Service (Voice Conversion):    http://kaizen:7861")
+            print("🎬 Script Reader (PDF to Speech):    http://kaizen:7862")
+            print("🎬 Script Reader (Tortoise TTS):     http://kaizen:7863")
+            print("=" * 50)
+            print("Press Ctrl+C to stop all services")
+        
+        # Block until any service exits or a shutdown signal arrives
+        exited = wait_for_exit(services, wakeup_r)
+        if exited is None:
+            print("\n🛑 Stopping services...")
+        else:
+            name, code = exited
+            print(f"⚠️  {name} service exited with code {code}")
+    
     except KeyboardInterrupt:
         print("\n🛑 Stopping services...")
         
     finally:
         # Clean up processes
-        for process, name in [
-            (tts_process, "TTS"),
-            (vc_process, "VC"),
-            (script_process, "Script Reader"),
-            (tortoise_script_process, "Script Reader (Tortoise)"),
-        ]:
-            if process.poll() is None:
-                print(f"Terminating {name} service...")
-                process.terminate()
-                try:
-                    process.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    print(f"Force killing {name} service...")
-                    process.kill()
+        stop_services(services)
 
 if __name__ == "__main__":
     main()
@@ -1,38 +1,36 @@
 """
 Test script to verify all Chatterbox services are working
 """
-import requests
-import time
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+SERVICES = (
+    (7860, "TTS Service"),
+    (7861, "Voice Conversion Service"),
+    (7862, "Script Reader Service"),
+)
 
 def test_service(port, name):
-    """Test if a service is responding"""
+    """Test if a service is accepting connections"""
+    # A TCP connect is enough for liveness and skips the TLS and HTTP round trips
     try:
-        response = requests.get(f"http://localhost:{port}", timeout=5)
-        if response.status_code == 200:
-            print(f"✅ {name} (port {port}): Working")
-            return True
-        else:
-            print(f"❌ {name} (port {port}): HTTP {response.status_code}")
-            return False
-    except requests.exceptions.RequestException as e:
-        print(f"❌ {name} (port {port}): Connection error - {e}")
-        return False
+        with socket.create_connection(("localhost", port), timeout=2):
+            return True, "Working"
+    except OSError as e:
+        return False, f"Connection error - {e}"
 
 def main():
     print("🧪 Testing Chatterbox Services...")
     print("=" * 50)
     
-    services = [
-        (7860, "TTS Service"),
-        (7861, "Voice Conversion Service"), 
-        (7862, "Script Reader Service")
-    ]
+    # Probe every service at once, then report in order
+    with ThreadPoolExecutor(max_workers=len(SERVICES)) as executor:
+        results = list(executor.map(test_service, *zip(*SERVICES)))
     
     all_working = True
-    for port, name in services:
-        working = test_service(port, name)
+    for (port, name), (working, status) in zip(SERVICES, results):
+        print(f"{'✅' if working else '❌'} {name} (port {port}): {status}")
         all_working = all_working and working
-        time.sleep(1)
     
     print("=" * 50)
     if all_working:
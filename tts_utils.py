@@ -0,0 +1,121 @@
+"""
+Shared model and audio helpers
+Mixed precision, torch.compile and 16-bit WAV encoding used by the TTS, VC and script reader apps
+"""
+import functools
+from io import BytesIO
+
+import numpy as np
+import soundfile as sf
+import torch
+
+
+def with_autocast(fn, dtype):
+    """Wrap fn so each call runs under CUDA autocast with the given dtype"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with torch.autocast("cuda", dtype=dtype):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def autocast_dtype():
+    """bfloat16 where the GPU supports it, float16 on older cards"""
+    return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+
+def enable_mixed_precision(model, device):
+    """Run the T3 decoder (TTS models only) and S3Gen flow under reduced-precision autocast on GPU"""
+    if not str(device).startswith("cuda"):
+        return model
+    dtype = autocast_dtype()
+    if hasattr(model, "t3"):
+        model.t3.inference = with_autocast(model.t3.inference, dtype)
+    # The HiFi-GAN vocoder stays in fp32; lower precision there produces clicks
+    model.s3gen.flow_inference = with_autocast(model.s3gen.flow_inference, dtype)
+    return model
+
+
+def keep_builtin_conds(model):
+    """Remember the model's built-in voice so it can be restored after a cloned one"""
+    # generate() stores each reference voice in model.conds and reuses it whenever
+    # no audio_prompt_path is given, so a shared model needs the default kept aside
+    model.builtin_conds = model.conds
+    return model
+
+
+def compile_model(model, device, warmup=None):
+    """torch.compile the per-step decoder modules, falling back to eager on failure
+
+    Compilation happens lazily on the first generate() call, so model.generate is
+    wrapped to switch back to the eager modules if that fails, with or without a
+    warmup. warmup, if given, is called with the compiled model so the first
+    request doesn't pay for compilation.
+    """
+    if not str(device).startswith("cuda") or not hasattr(torch, "compile"):
+        return model
+    flow_decoder = model.s3gen.flow.decoder
+    eager_estimator = flow_decoder.estimator
+    eager_tfmr = model.t3.tfmr if hasattr(model, "t3") else None
+    eager_generate = model.generate
+    
+    def use_eager(e):
+        print(f"torch.compile failed, using eager model: {e}")
+        if eager_tfmr is not None:
+            model.t3.tfmr = eager_tfmr
+        flow_decoder.estimator = eager_estimator
+        model.generate = eager_generate
+    
+    @functools.wraps(eager_generate)
+    def generate(*args, **kwargs):
+        try:
+            return eager_generate(*args, **kwargs)
+        except torch._dynamo.exc.TorchDynamoException as e:
+            use_eager(e)
+            return eager_generate(*args, **kwargs)
+    
+    try:
+        # Every dialogue line and source clip has its own length; leave room for the
+        # extra graphs instead of falling back to eager after the default limit of 8
+        torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, 64)
+        # The T3 backbone runs once per generated token and the flow estimator once
+        # per CFM step, so both benefit from fused kernels. The default mode skips
+        # CUDA graphs, which would be re-recorded for every length the KV cache grows to.
+        if eager_tfmr is not None:
+            model.t3.tfmr = torch.compile(eager_tfmr, fullgraph=False, dynamic=True)
+        flow_decoder.estimator = torch.compile(eager_estimator, fullgraph=False, dynamic=True)
+        model.generate = generate
+        if warmup is not None:
+            warmup(model)
+    except Exception as e:
+        use_eager(e)
+    return model
+
+
+def wav_to_pcm16(wav):
+    """Clamp a generated waveform to [-1, 1] and quantize it to a mono 16-bit PCM numpy array
+
+    Samples that overshoot full scale are clipped rather than handed to the integer
+    conversion, and the full squeeze also flattens Tortoise's (1, 1, N) output.
+    """
+    if torch.is_tensor(wav):
+        # generate() returns CPU tensors, so numpy() shares the buffer rather than copying
+        return (wav.detach().squeeze().clamp(-1, 1) * 32767).to(torch.int16).numpy()
+    return (np.clip(np.asarray(wav).squeeze(), -1, 1) * 32767).astype(np.int16)
+
+
+def encode_wav(wav, sample_rate):
+    """Encode a generated waveform as an in-memory 16-bit WAV file (soundfile's default WAV subtype)"""
+    buffer = BytesIO()
+    sf.write(buffer, wav_to_pcm16(wav), sample_rate, format='WAV', subtype='PCM_16')
+    return buffer.getbuffer()
+
+
+def store_wav(zipf, name, wav, sample_rate, preview_path=None):
+    """Add a generated waveform to an open ZIP, optionally also saving it to disk"""
+    data = encode_wav(wav, sample_rate)
+    with zipf.open(name, 'w') as entry:
+        entry.write(data)
+    if preview_path:
+        with open(preview_path, 'wb') as f:
+            f.write(data)